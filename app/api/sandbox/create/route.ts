@@ -47,7 +47,7 @@ export async function POST(req: NextRequest) {
       return NextResponse.json({ error: data.error || "Failed to create sandbox" }, { status: 502 });
     }
 
-    createSession(data.sandbox_id, repoUrl);
+    createSession(data.sandbox_id, repoUrl, data.repo_snapshot);
     console.log(`  ✅ Sandbox created: ${data.sandbox_id}`);
 
     return NextResponse.json({
@@ -4,7 +4,21 @@ import { getSession, addMessage, addStep } from "@/lib/sandbox-session";
 import { getExecCommandUrl } from "@/lib/modal-urls";
 
 const CLAUDE_MODEL = process.env.CLAUDE_SANDBOX_MODEL || "claude-sonnet-4-20250514";
+// Cheaper/faster model for routine rounds (clean, short command output). Set to "" to disable.
+const CLAUDE_FAST_MODEL = process.env.CLAUDE_SANDBOX_FAST_MODEL ?? "claude-haiku-4-5";
+const FAST_MAX_OUTPUT_CHARS = 2000;
 const MAX_TOOL_ROUNDS = 200; // max tool-use rounds per turn
+// Once command outputs older than the last KEEP_FULL_ROUNDS rounds add up to this many
+// chars, they are all replaced with one-line summaries.
+const COMPACT_AFTER_CHARS = 60_000;
+const KEEP_FULL_ROUNDS = 4;
+const COMPACTED_PREFIX = "[output compacted]";
+// Output budget per round: most rounds are a sentence plus one command. A round that
+// hits its cap is redone (or followed) with the full budget — in practice that's the
+// closing summary, which is the reply that carries no command.
+const MAX_OUTPUT_TOKENS = 4096;
+const STOP_SEQUENCES = ["\nDONE"];
+const MAX_PARALLEL_TOOLS = 4; // tool_use blocks from one turn run concurrently, up to this many
 
 const anthropic = new Anthropic({ apiKey: process.env.ANTHROPIC_API_KEY });
 
@@ -16,7 +30,8 @@ The sandbox is persistent: packages you install stay installed, files you create
 environment variables you set stick around.
 
 RULES:
-1. Start by exploring: ls, cat README.md, look at the project structure.
+1. Start by exploring: ls, cat README.md, look at the project structure. If the first message
+   already includes a repo snapshot (listing + README/requirements), don't re-read those files.
 2. Follow the README's setup instructions carefully.
 3. When you pip-install, use --quiet to reduce noise.
 4. If a command fails, read the error, try to fix it, and retry. Try up to 3 fixes per error.
@@ -27,7 +42,7 @@ RULES:
    and verify it's running (curl localhost:<port>).
 7. If it requires a GPU, try CPU mode. If not possible, explain why.
 8. Keep commands short. Check output between steps. Don't chain with &&.
-9. When done (success or failure), give a clear summary.
+9. When done (success or failure), give a clear summary, then end with a line containing only DONE.
 
 COMMUNICATION STYLE:
 - Be conversational. You're pair-programming with the user.
@@ -38,16 +53,25 @@ COMMUNICATION STYLE:
 CONSTRAINTS:
 - CPU only (no GPU).
 - Internet access available.
-- Working directory: /root/repo (the cloned repository).
+- The cloned repository is at /root/repo. The first command starts there; after that each command
+  continues in the directory the previous one left (cd persists, as do exported variables).
 - Command timeout: 120 seconds.
 - Be efficient — aim to get things running in under 20 commands.`;
 
+// Marked for prompt caching: tools + system prompt form an identical prefix on every round.
+const SYSTEM: Anthropic.TextBlockParam[] = [
+  { type: "text", text: SYSTEM_PROMPT, cache_control: { type: "ephemeral" } },
+];
+
 const TOOLS: Anthropic.Tool[] = [
   {
     name: "execute_command",
     description:
-      "Execute a shell command in the sandbox. The command runs from /root/repo. " +
-      "Returns stdout, stderr, and exit code. Timeout: 120 seconds.",
+      "Execute a shell command in the sandbox. Starts in /root/repo on the first call; after that it " +
+      "continues in the directory the last command left (cd and exported env vars persist). " +
+      "Returns stdout, stderr, and exit code. Timeout: 120 seconds. " +
+      "Several calls in one turn run in parallel, so only batch independent commands " +
+      "(e.g. reading a few files); anything that depends on an earlier result goes in a later turn.",
     input_schema: {
       type: "object" as const,
       properties: {
@@ -61,10 +85,130 @@ const TOOLS: Anthropic.Tool[] = [
   },
 ];
 
+/**
+ * Returns a copy of the conversation with a prompt-cache breakpoint on the last block
+ * of the final message. The history only ever grows by appending, so each round reads
+ * everything up to the previous breakpoint from cache. Only the request copy is marked;
+ * the stored history stays clean (the API allows at most 4 breakpoints per request).
+ */
+function withCacheBreakpoint(messages: Anthropic.MessageParam[]): Anthropic.MessageParam[] {
+  const last = messages[messages.length - 1];
+  if (!last) return messages;
+  const blocks: Anthropic.ContentBlockParam[] =
+    typeof last.content === "string" ? [{ type: "text", text: last.content }] : [...last.content];
+  if (blocks.length === 0) return messages;
+  blocks[blocks.length - 1] = {
+    ...blocks[blocks.length - 1],
+    cache_control: { type: "ephemeral" },
+  } as Anthropic.ContentBlockParam;
+  return [...messages.slice(0, -1), { ...last, content: blocks }];
+}
+
+/**
+ * Bounds history growth by summarising old command outputs in place. The tool_result
+ * blocks are shared with the stored session history, so compaction sticks across turns.
+ * The guard counts only outputs that can still be compacted (uncompacted and outside the
+ * kept rounds), so each batch clears it and the next one waits for another
+ * COMPACT_AFTER_CHARS of old output, however large the recent rounds or the repo
+ * snapshot are; the prompt-cache prefix is only invalidated at those batches.
+ */
+function compactHistory(messages: Anthropic.MessageParam[]): void {
+  const commands = new Map<string, string>();
+  const resultMessages: Anthropic.ToolResultBlockParam[][] = [];
+  for (const m of messages) {
+    if (typeof m.content === "string") continue;
+    const results: Anthropic.ToolResultBlockParam[] = [];
+    for (const block of m.content) {
+      if (block.type === "tool_use") {
+        commands.set(block.id, (block.input as { command: string }).command);
+      } else if (block.type === "tool_result") {
+        results.push(block);
+      }
+    }
+    if (results.length > 0) resultMessages.push(results);
+  }
+
+  const compactable = resultMessages
+    .slice(0, -KEEP_FULL_ROUNDS)
+    .flat()
+    .filter(
+      (b): b is Anthropic.ToolResultBlockParam & { content: string } =>
+        typeof b.content === "string" && !b.content.startsWith(COMPACTED_PREFIX)
+    );
+  const size = compactable.reduce((n, b) => n + b.content.length, 0);
+  if (size <= COMPACT_AFTER_CHARS) return;
+
+  for (const block of compactable) {
+    const exit = block.content.match(/^exit_code: (-?\d+)/)?.[1] ?? "?";
+    const firstLine =
+      block.content
+        .split("\n")
+        .find((l) => l.trim() && !/^(exit_code:|stdout:|stderr:|\(empty\))/.test(l))
+        ?.slice(0, 160) ?? "";
+    const command = (commands.get(block.tool_use_id) ?? "").slice(0, 120);
+    block.content =
+      `${COMPACTED_PREFIX} $ ${command}: exit ${exit}, ${block.content.length} chars` +
+      (firstLine ? `; ${firstLine}` : "");
+  }
+}
+
+/** Runs at most `max` tasks at a time; the rest wait in FIFO order. */
+function createLimiter(max: number) {
+  let active = 0;
+  const waiting: Array<() => void> = [];
+  return async function run<T>(task: () => Promise<T>): Promise<T> {
+    if (active < max) active++;
+    else await new Promise<void>((resolve) => waiting.push(resolve));
+    try {
+      return await task();
+    } finally {
+      // Hand the slot straight to the next waiter so new callers can't jump the queue
+      const next = waiting.shift();
+      if (next) next();
+      else active--;
+    }
+  };
+}
+
+type ExecResult = { stdout: string; stderr: string; exit_code: number };
+
+/**
+ * Picks the model for the next round. The fast model only handles rounds whose previous
+ * commands all succeeded with short output and where Claude wasn't already talking
+ * about a failure; planning (first round), debugging and the last rounds before the
+ * step limit stay on the main model. Switching models forfeits that round's prompt cache,
+ * which is why the bar for the fast model is "clearly routine".
+ */
+function pickModel(lastResults: ExecResult[], lastText: string, toolRounds: number): string {
+  if (!CLAUDE_FAST_MODEL || lastResults.length === 0) return CLAUDE_MODEL;
+  if (toolRounds >= MAX_TOOL_ROUNDS - 3) return CLAUDE_MODEL;
+  const outputChars = lastResults.reduce(
+    (n, r) => n + (r.stdout?.length ?? 0) + (r.stderr?.length ?? 0),
+    0
+  );
+  if (outputChars >= FAST_MAX_OUTPUT_CHARS) return CLAUDE_MODEL;
+  if (lastResults.some((r) => r.exit_code !== 0)) return CLAUDE_MODEL;
+  if (/error|fail|traceback/i.test(lastText)) return CLAUDE_MODEL;
+  return CLAUDE_FAST_MODEL;
+}
+
+/**
+ * Output token cap for the next round, by phase: opening rounds and routine installs
+ * are short and debugging after a failure gets more room. Which round is the final
+ * summary isn't known up front; when a capped round turns out to be a reply with no
+ * command (i.e. the agent is finishing) and runs out, it's redone with the full budget.
+ */
+function pickMaxTokens(lastResults: ExecResult[], toolRounds: number, hitCap: boolean): number {
+  if (hitCap) return MAX_OUTPUT_TOKENS;
+  if (toolRounds < 3) return 512;
+  if (lastResults.some((r) => r.exit_code !== 0)) return 2048;
+  return 1024;
+}
+
 async function execInSandbox(
   sandboxId: string,
   command: string
-): Promise<{ stdout: string; stderr: string; exit_code: number }> {
+): Promise<ExecResult> {
   const execUrl = getExecCommandUrl();
 
   const res = await fetch(execUrl, {
@@ -129,8 +273,13 @@ export async function POST(req: NextRequest) {
     );
   }
 
-  // Add user message to history
-  addMessage(sandboxId, { role: "user", content: userMessage });
+  // Add user message to history. On the first turn, include the snapshot gathered at
+  // sandbox creation so the agent doesn't spend its opening rounds on ls/cat README.
+  const content =
+    session.messages.length === 0 && session.repoSnapshot
+      ? `${userMessage}\n\n<repo_snapshot>\nAlready gathered from /root/repo:\n${session.repoSnapshot}\n</repo_snapshot>`
+      : userMessage;
+  addMessage(sandboxId, { role: "user", content });
 
   const encoder = new TextEncoder();
 
@@ -150,43 +299,137 @@ export async function POST(req: NextRequest) {
         }));
 
         let toolRounds = 0;
+        let lastResults: ExecResult[] = [];
+        let lastText = "";
+        let hitCap = false;
+        // Text already shown to the user from a round cut off before its command; the
+        // redo continues from it (assistant prefill) instead of writing it again.
+        let prefill: Anthropic.TextBlock[] = [];
+
+        async function runTool(tool: { id: string; command: string }): Promise<Anthropic.ToolResultBlockParam> {
+          emit("command", { command: tool.command });
+
+          const result = await execInSandbox(sandboxId, tool.command);
+          lastResults.push(result);
+
+          // Store step
+          addStep(sandboxId, {
+            command: tool.command,
+            stdout: result.stdout,
+            stderr: result.stderr,
+            exit_code: result.exit_code,
+          });
 
-        // Agent loop: Claude thinks → executes tools → thinks again → ...
-        while (toolRounds < MAX_TOOL_ROUNDS) {
-          const response = await anthropic.messages.create({
-            model: CLAUDE_MODEL,
-            max_tokens: 4096,
-            system: SYSTEM_PROMPT,
-            tools: TOOLS,
-            messages: claudeMessages,
+          emit("output", {
+            command: tool.command,
+            stdout: result.stdout?.slice(0, 3000) || "",
+            stderr: result.stderr?.slice(0, 2000) || "",
+            exit_code: result.exit_code,
           });
 
-          // Store assistant response in conversation
-          const assistantContent = response.content;
-          addMessage(sandboxId, { role: "assistant", content: assistantContent as unknown as string });
-          claudeMessages.push({ role: "assistant", content: assistantContent });
+          const outputStr =
+            `exit_code: ${result.exit_code}\n` +
+            `stdout:\n${result.stdout || "(empty)"}\n` +
+            `stderr:\n${result.stderr || "(empty)"}`;
 
-          // Process response blocks
-          const textBlocks: string[] = [];
-          const toolUseBlocks: Array<{ id: string; command: string }> = [];
+          return { type: "tool_result", tool_use_id: tool.id, content: outputStr };
+        }
 
-          for (const block of response.content) {
+        // Agent loop: Claude thinks → executes tools → thinks again → ...
+        while (toolRounds < MAX_TOOL_ROUNDS) {
+          const model = pickModel(lastResults, lastText, toolRounds);
+          const maxTokens = pickMaxTokens(lastResults, toolRounds, hitCap);
+          lastResults = [];
+          compactHistory(claudeMessages);
+
+          // Stream the response so each command starts as soon as its tool_use block is
+          // complete, while Claude is still generating the rest of the turn. Commands from
+          // the same turn run concurrently; results are collected in the order issued.
+          const textBlocks: string[] = prefill.map((b) => b.text);
+          const toolUseBlocks: Array<{ id: string; command: string }> = [];
+          const kept: Anthropic.ContentBlock[] = [...prefill];
+          const pending: Array<Promise<Anthropic.ToolResultBlockParam>> = [];
+          const limit = createLimiter(MAX_PARALLEL_TOOLS);
+
+          const responseStream = anthropic.messages.stream({
+            model,
+            max_tokens: maxTokens,
+            stop_sequences: STOP_SEQUENCES,
+            system: SYSTEM,
+            tools: TOOLS,
+            messages: withCacheBreakpoint(
+              prefill.length > 0 ? [...claudeMessages, { role: "assistant", content: prefill }] : claudeMessages
+            ),
+          });
+          function accept(block: Anthropic.ContentBlock) {
             if (block.type === "text") {
+              kept.push(block);
               textBlocks.push(block.text);
+              // Emit thinking/text from Claude as each block completes
+              if (block.text) emit("thinking", { text: block.text });
             } else if (block.type === "tool_use") {
-              const cmd = (block.input as { command: string }).command;
-              toolUseBlocks.push({ id: block.id, command: cmd });
+              const command = (block.input as { command?: unknown }).command;
+              if (typeof command !== "string") return;
+              kept.push(block);
+              const tool = { id: block.id, command };
+              toolUseBlocks.push(tool);
+              const done = limit(() => runTool(tool));
+              done.catch(() => undefined); // surfaced via Promise.all below
+              pending.push(done);
             }
           }
 
-          // Emit any thinking/text from Claude
-          if (textBlocks.length > 0) {
-            const fullText = textBlocks.join("\n");
-            emit("thinking", { text: fullText });
+          // content_block_stop also fires for a block cut off by max_tokens, so a finished
+          // block is held until the next one starts (it wasn't cut off) or message_delta
+          // brings the stop reason (only the last block can have been cut off).
+          let held: Anthropic.ContentBlock | null = null;
+          function release(stopReason?: string | null) {
+            const block = held;
+            held = null;
+            if (!block) return;
+            const cutOff = stopReason === "max_tokens";
+            // A cut-off tool_use is never run; cut-off text is kept only at the full budget
+            if (cutOff && (block.type === "tool_use" || maxTokens < MAX_OUTPUT_TOKENS)) return;
+            accept(block);
           }
+          responseStream.on("contentBlock", (block) => {
+            held = block;
+          });
+          responseStream.on("streamEvent", (event) => {
+            if (event.type === "content_block_start") release();
+            else if (event.type === "message_delta") release(event.delta.stop_reason);
+          });
+          const response = await responseStream.finalMessage();
+          const truncated = response.stop_reason === "max_tokens";
+          release(response.stop_reason); // no-op unless message_delta was never seen
+          console.log(
+            `  [sandbox ${sandboxId}] round ${toolRounds + 1} (${model}): input=${response.usage.input_tokens} ` +
+              `cache_read=${response.usage.cache_read_input_tokens ?? 0} ` +
+              `cache_write=${response.usage.cache_creation_input_tokens ?? 0}`
+          );
+
+          // Cut off by a reduced cap: keep the blocks that completed (their commands are
+          // already running) and give the next round the full budget. If no command came
+          // through, redo the round without storing it, continuing after any text the user
+          // has already seen. The API rejects a prefill ending in whitespace.
+          hitCap = truncated && maxTokens < MAX_OUTPUT_TOKENS;
+          if (hitCap && toolUseBlocks.length === 0) {
+            prefill = (kept as Anthropic.TextBlock[])
+              .map((b) => ({ ...b, text: b.text.trimEnd() }))
+              .filter((b) => b.text);
+            continue;
+          }
+          prefill = [];
+
+          // Store assistant response in conversation (only blocks that were accepted, so
+          // every stored tool_use has a result)
+          const assistantContent = kept;
+          addMessage(sandboxId, { role: "assistant", content: assistantContent as unknown as string });
+          claudeMessages.push({ role: "assistant", content: assistantContent });
 
           // If Claude is done (no tool calls), emit final message and break
           if (response.stop_reason === "end_turn" || toolUseBlocks.length === 0) {
+            await Promise.all(pending);
             const finalText = textBlocks.join("\n");
             if (finalText) {
               emit("message", { text: finalText });
@@ -194,40 +437,9 @@ export async function POST(req: NextRequest) {
             break;
           }
 
-          // Execute tool calls
-          const toolResults: Anthropic.ToolResultBlockParam[] = [];
-
-          for (const tool of toolUseBlocks) {
-            emit("command", { command: tool.command });
-
-            const result = await execInSandbox(sandboxId, tool.command);
-
-            // Store step
-            addStep(sandboxId, {
-              command: tool.command,
-              stdout: result.stdout,
-              stderr: result.stderr,
-              exit_code: result.exit_code,
-            });
-
-            emit("output", {
-              command: tool.command,
-              stdout: result.stdout?.slice(0, 3000) || "",
-              stderr: result.stderr?.slice(0, 2000) || "",
-              exit_code: result.exit_code,
-            });
-
-            const outputStr =
-              `exit_code: ${result.exit_code}\n` +
-              `stdout:\n${result.stdout || "(empty)"}\n` +
-              `stderr:\n${result.stderr || "(empty)"}`;
-
-            toolResults.push({
-              type: "tool_result",
-              tool_use_id: tool.id,
-              content: outputStr,
-            });
-          }
+          // Collect tool results (already running since their blocks arrived)
+          const toolResults = await Promise.all(pending);
+          lastText = textBlocks.join("\n");
 
           // Feed tool results back to Claude
           addMessage(sandboxId, {
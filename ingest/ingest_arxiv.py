@@ -15,48 +15,100 @@ Usage:
   # CS domain only (computer science papers)
   python ingest_arxiv.py --from 2025-01-01 --until 2025-03-31 --cs-only
 
-Env: ELASTICSEARCH_CLOUD_ID, ELASTICSEARCH_API_KEY, ES_INDEX (default: arxiv-papers-2026)
+  # Large backfill: no refresh/replicas during the load, force-merge at the end
+  python ingest_arxiv.py --start 2024-01 --end 2026-02 --tune-for-bulk
+
+  # Fetch the next page while the current one is indexed (needs elasticsearch[async])
+  python ingest_arxiv.py --start 2024-01 --end 2026-02 --async
+
+Env: ELASTICSEARCH_CLOUD_ID, ELASTICSEARCH_API_KEY, ES_INDEX (default: arxiv-papers-2026),
+     ES_BULK_THREADS (parallel bulk indexing threads, default: 8),
+     ES_BULK_BYTES (max bytes per bulk request, default: 10 MB)
 """
 
 import argparse
+import asyncio
+import inspect
+import io
+import logging
 import os
 import re
 import sys
 import time
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager, nullcontext
 from datetime import date, timedelta
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
 from urllib.parse import urlencode
 
+import httpx
 import requests
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from elasticsearch import AsyncElasticsearch, BadRequestError, Elasticsearch
+from elasticsearch.helpers import async_bulk, parallel_bulk
+
+try:
+    from lxml import etree as LET
+except ImportError:  # fall back to the (slower) stdlib parser
+    LET = None
+
+# Parser options for every OAI page. Dropping the pretty-print whitespace and comments
+# means fewer nodes to build and clear per record, and collect_ids=False skips the
+# xml:id hash table nothing here looks up; entities/network stay off and huge_tree
+# stays off, so a malformed page cannot blow up memory.
+_LXML_OPTIONS = {
+    "remove_blank_text": True,
+    "remove_comments": True,
+    "remove_pis": True,
+    "collect_ids": False,
+    "resolve_entities": False,
+    "no_network": True,
+    "huge_tree": False,
+}
+
+# Add project root for imports
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lib.es_client import get_client
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 INDEX_NAME = os.getenv("ES_INDEX", "arxiv-papers-2026")
+BULK_THREADS = int(os.getenv("ES_BULK_THREADS", "8"))
+BULK_CHUNK_BYTES = int(os.getenv("ES_BULK_BYTES", str(10 * 1024 * 1024)))
+BULK_CHUNK_DOCS = 10_000  # high enough that BULK_CHUNK_BYTES decides the bulk request size
 
 OAI_BASE = "https://export.arxiv.org/oai2"
-ARXIV_NS = {"arxiv": "http://arxiv.org/OAI/arXiv/"}
+# One keep-alive session for every page, so the TLS handshake is paid once per harvest
+_SESSION = requests.Session()
+_SESSION.headers["User-Agent"] = "elastic-papers/1.0"
+# OAI-PMH XML compresses ~5x; resp.raw.decode_content inflates it while it is parsed
+_SESSION.headers["Accept-Encoding"] = "gzip, deflate"
+_VER_RE = re.compile(r"v\d+$")  # arXiv version suffix, e.g. 2601.00001v2
 OAI_NS = "http://www.openarchives.org/OAI/2.0/"
-
-
-def _get_es_client() -> Elasticsearch:
-    cloud_id = os.getenv("ELASTICSEARCH_CLOUD_ID")
-    url = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
-    user = os.getenv("ELASTICSEARCH_USER")
-    password = os.getenv("ELASTICSEARCH_PASSWORD")
-    api_key = os.getenv("ELASTICSEARCH_API_KEY")
-    if cloud_id and api_key:
-        return Elasticsearch(cloud_id=cloud_id, api_key=api_key)
-    if cloud_id and user and password:
-        return Elasticsearch(cloud_id=cloud_id, basic_auth=(user, password))
-    if url and user and password:
-        return Elasticsearch(hosts=[url], basic_auth=(user, password))
-    if url:
-        return Elasticsearch(hosts=[url])
-    print("Error: Set ELASTICSEARCH_CLOUD_ID + ELASTICSEARCH_API_KEY", file=sys.stderr)
-    sys.exit(1)
+ARXIV_NS_URI = "http://arxiv.org/OAI/arXiv/"
+
+# Fully-qualified (Clark notation) tags, so lookups on the hot path are plain find() calls
+TAG_RECORD = f"{{{OAI_NS}}}record"
+TAG_HEADER = f"{{{OAI_NS}}}header"
+TAG_META = f"{{{OAI_NS}}}metadata"
+TAG_RESUMPTION = f"{{{OAI_NS}}}resumptionToken"
+TAG_ERROR = f"{{{OAI_NS}}}error"
+
+ARXIV_ROOT = f"{{{ARXIV_NS_URI}}}arXiv"
+ARXIV_ID = f"{{{ARXIV_NS_URI}}}id"
+ARXIV_TITLE = f"{{{ARXIV_NS_URI}}}title"
+ARXIV_ABSTRACT = f"{{{ARXIV_NS_URI}}}abstract"
+ARXIV_CREATED = f"{{{ARXIV_NS_URI}}}created"
+ARXIV_CATEGORIES = f"{{{ARXIV_NS_URI}}}categories"
+ARXIV_AUTHORS = f"{{{ARXIV_NS_URI}}}authors"
+ARXIV_AUTHOR = f"{{{ARXIV_NS_URI}}}author"
+ARXIV_KEYNAME = f"{{{ARXIV_NS_URI}}}keyname"
+ARXIV_FORENAMES = f"{{{ARXIV_NS_URI}}}forenames"
 
 
 def _text(el) -> str | None:
@@ -66,55 +118,39 @@ def _text(el) -> str | None:
     return t if t else None
 
 
-def _first(el, tag: str):
-    if el is None:
-        return None
-    for ns in (ARXIV_NS, {}):
-        c = el.find(f"arxiv:{tag}", ns) if ns else el.find(tag)
-        if c is not None:
-            return c
-    for c in el.iter():
-        if c.tag.split("}")[-1] == tag:
-            return c
-    return None
-
-
-def _all(el, tag: str):
-    if el is None:
-        return []
-    f = el.findall(f"arxiv:{tag}", ARXIV_NS)
-    if f:
-        return f
-    return [c for c in el.iter() if c.tag.split("}")[-1] == tag]
-
-
 def parse_record(record_el) -> dict | None:
-    meta = record_el.find(f".//{{{OAI_NS}}}metadata")
+    meta = record_el.find(TAG_META)
     if meta is None:
         return None
-    arxiv = meta.find("arxiv:arXiv", ARXIV_NS) or meta.find(".//*[local-name()='arXiv']") or meta
+    # Elements are compared against None explicitly: lxml elements without children are falsy.
+    arxiv = meta.find(ARXIV_ROOT)
+    if arxiv is None:
+        log.debug("record without an arXiv metadata block, skipping")
+        return None
 
-    title = _text(_first(arxiv, "title")) or ""
-    abstract = _text(_first(arxiv, "abstract")) or ""
-    arxiv_id = _text(_first(arxiv, "id"))
-    created = _text(_first(arxiv, "created")) or ""
-    cats = _text(_first(arxiv, "categories")) or ""
+    arxiv_id = _text(arxiv.find(ARXIV_ID))
+    if not arxiv_id:
+        log.debug("arXiv record without an id, skipping")
+        return None
+    if arxiv_id[-1].isdigit() and "v" in arxiv_id:
+        arxiv_id = _VER_RE.sub("", arxiv_id)
+
+    title = _text(arxiv.find(ARXIV_TITLE)) or ""
+    abstract = _text(arxiv.find(ARXIV_ABSTRACT)) or ""
+    created = _text(arxiv.find(ARXIV_CREATED)) or ""
+    cats = _text(arxiv.find(ARXIV_CATEGORIES)) or ""
     categories = [c.strip() for c in cats.split() if c.strip()]
 
     authors = []
-    authors_el = _first(arxiv, "authors")
-    if authors_el:
-        for a in _all(authors_el, "author"):
-            k = _text(_first(a, "keyname")) or ""
-            f = _text(_first(a, "forenames")) or ""
+    authors_el = arxiv.find(ARXIV_AUTHORS)
+    if authors_el is not None:
+        for a in authors_el.iterfind(ARXIV_AUTHOR):
+            k = _text(a.find(ARXIV_KEYNAME)) or ""
+            f = _text(a.find(ARXIV_FORENAMES)) or ""
             name = f"{f} {k}".strip() or k or f
             if name:
                 authors.append(name)
 
-    if not arxiv_id:
-        return None
-    arxiv_id = re.sub(r"v\d+$", "", arxiv_id)
-
     return {
         "arxiv_id": arxiv_id,
         "title": title,
@@ -125,71 +161,238 @@ def parse_record(record_el) -> dict | None:
     }
 
 
-def fetch_page(from_d: str, until_d: str, token: str | None = None) -> tuple[list[dict], str | None]:
+def _iter_oai(source):
+    """Stream <record>, <error> and <resumptionToken> elements out of an OAI-PMH response.
+
+    Each element is cleared once the caller is done with it, so peak memory stays at
+    roughly one record instead of the whole ListRecords DOM.
+    """
+    tags = (TAG_RECORD, TAG_ERROR, TAG_RESUMPTION)
+    if LET is not None:
+        for _, el in LET.iterparse(source, events=("end",), tag=tags, **_LXML_OPTIONS):
+            yield el
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+        return
+    for _, el in ET.iterparse(source, events=("end",)):
+        if el.tag in tags:
+            yield el
+            el.clear()
+
+
+def _oai_url(from_d: str, until_d: str, token: str | None = None) -> str:
     if token:
-        url = f"{OAI_BASE}?verb=ListRecords&resumptionToken={token}"
-    else:
-        url = f"{OAI_BASE}?{urlencode({'verb':'ListRecords','metadataPrefix':'arXiv','from':from_d,'until':until_d})}"
-    r = requests.get(url, headers={"User-Agent": "elastic-papers/1.0"}, timeout=120)
-    if not r.ok:
-        raise RuntimeError(f"OAI failed: {r.status_code}")
-    root = ET.fromstring(r.content)
-    err = root.find(".//{http://www.openarchives.org/OAI/2.0/}error")
-    if err is not None:
-        raise RuntimeError(f"OAI: {err.get('code','')} - {(err.text or '').strip()}")
-
-    records = []
-    for rec in root.findall(".//{http://www.openarchives.org/OAI/2.0/}record"):
-        h = rec.find(".//{http://www.openarchives.org/OAI/2.0/}header")
+        return f"{OAI_BASE}?verb=ListRecords&resumptionToken={token}"
+    return f"{OAI_BASE}?{urlencode({'verb':'ListRecords','metadataPrefix':'arXiv','from':from_d,'until':until_d})}"
+
+
+def _parse_page(source, cursor: dict) -> Iterator[dict]:
+    """Yield docs from one ListRecords response (file-like); the next resumption token ends up in cursor["token"]."""
+    cursor["token"] = None
+    for el in _iter_oai(source):
+        if el.tag == TAG_ERROR:
+            raise RuntimeError(f"OAI: {el.get('code','')} - {(el.text or '').strip()}")
+        if el.tag == TAG_RESUMPTION:
+            cursor["token"] = (el.text or "").strip() or None
+            continue
+        h = el.find(TAG_HEADER)
         if h is not None and h.get("status") == "deleted":
             continue
-        doc = parse_record(rec)
+        doc = parse_record(el)
         if doc:
-            records.append(doc)
-    rt = root.find(".//{http://www.openarchives.org/OAI/2.0/}resumptionToken")
-    ntok = (rt.text or "").strip() or None
-    return records, ntok
+            yield doc
 
 
-def filter_in_range(docs: list[dict], from_d: str, until_d: str) -> list[dict]:
-    return [d for d in docs if from_d <= (d.get("created") or "") <= until_d]
+def fetch_page(from_d: str, until_d: str, cursor: dict) -> Iterator[dict]:
+    """Yield the docs of one OAI page as they are parsed.
 
+    Pass the resumption token in cursor["token"] (None for the first page); once the
+    generator is exhausted it holds the token for the next page, or None after the last.
+    """
+    url = _oai_url(from_d, until_d, cursor.get("token"))
+    with _SESSION.get(url, timeout=120, stream=True) as r:
+        if not r.ok:
+            raise RuntimeError(f"OAI failed: {r.status_code}")
+        # Parse straight off the socket so the page is never buffered in full
+        r.raw.decode_content = True
+        yield from _parse_page(r.raw, cursor)
 
-def filter_cs_only(docs: list[dict]) -> list[dict]:
-    """Keep only papers with at least one cs.* category (computer science)."""
-    return [d for d in docs if any((c or "").startswith("cs.") for c in d.get("categories") or [])]
 
+def _polite_wait(since: float, interval: float = 1.0):
+    """Sleep out whatever is left of arXiv's 1s spacing between request starts.
 
-def ingest_range(es: Elasticsearch, from_d: str, until_d: str, cs_only: bool = False, verbose: bool = True) -> int:
-    total = 0
-    token = None
+    `since` is when the previous request was issued, so parsing and indexing that page
+    (which happen between yields) count toward the delay.
+    """
+    dt = time.monotonic() - since
+    if dt < interval:
+        time.sleep(interval - dt)
+
+
+def harvest(from_d: str, until_d: str, verbose: bool = True) -> Iterator[dict]:
+    """Yield every doc in the OAI window, following resumption tokens across pages."""
+    cursor = {"token": None}
     page = 0
+    requested_at = None
     while True:
+        if requested_at is not None:
+            _polite_wait(requested_at)
         page += 1
-        records, token = fetch_page(from_d, until_d, token)
-        filtered = filter_in_range(records, from_d, until_d)
-        if cs_only:
-            filtered = filter_cs_only(filtered)
-        if filtered:
-            actions = [
-                {"_index": INDEX_NAME, "_id": d["arxiv_id"], "_source": {k: d[k] for k in ("arxiv_id", "title", "authors", "abstract", "categories", "created")}}
-                for d in filtered
-            ]
-            bulk(es.options(request_timeout=60), actions, raise_on_error=False)
-            total += len(actions)
+        n = 0
+        requested_at = time.monotonic()
+        for doc in fetch_page(from_d, until_d, cursor):
+            n += 1
+            yield doc
         if verbose:
-            print(f"  p{page}: +{len(filtered)} (total {total})", flush=True)
-        if not token:
-            break
-        time.sleep(1)
+            print(f"  p{page}: {n} records", flush=True)
+        if not cursor["token"]:
+            return
+
+
+def in_range(doc: dict, from_d: str, until_d: str) -> bool:
+    """True if the paper's arXiv `created` date is in range.
+
+    OAI from/until select on the record datestamp (last metadata change), so a window
+    also returns older papers that were revised in it. Skip this check (--by-datestamp)
+    when that is what you want.
+    """
+    return from_d <= (doc.get("created") or "") <= until_d
+
+
+def is_cs(doc: dict) -> bool:
+    """True for papers with at least one cs.* category (computer science)."""
+    return any((c or "").startswith("cs.") for c in doc.get("categories") or [])
+
+
+def _bulk_actions(docs):
+    """parse_record already returns the exact document shape, so it is sent as _source unchanged."""
+    for d in docs:
+        yield {"_index": INDEX_NAME, "_id": d["arxiv_id"], "_source": d}
+
+
+def _existing_ids(es, ids: list[str]):
+    """The subset of `ids` already in the index, via one mget without _source.
+
+    Works with both clients: with AsyncElasticsearch the set comes back as an awaitable.
+    """
+    def found(resp) -> set[str]:
+        return {r["_id"] for r in resp["docs"] if r.get("found")}
+
+    resp = es.mget(index=INDEX_NAME, ids=ids, source=False)
+    if inspect.isawaitable(resp):
+        async def resolve():
+            return found(await resp)
+        return resolve()
+    return found(resp)
+
+
+def skip_existing(es: Elasticsearch, docs, batch: int = 1000):
+    """Drop docs whose arxiv_id is already indexed: one mget per batch instead of re-sending them all."""
+    docs = iter(docs)
+    while chunk := list(islice(docs, batch)):
+        existing = _existing_ids(es, [d["arxiv_id"] for d in chunk])
+        yield from (d for d in chunk if d["arxiv_id"] not in existing)
+
+
+def _select(docs, from_d: str, until_d: str, cs_only: bool, by_datestamp: bool):
+    if not by_datestamp:
+        docs = filter(lambda d: in_range(d, from_d, until_d), docs)
+    if cs_only:
+        docs = filter(is_cs, docs)
+    return docs
+
+
+def ingest_range(es: Elasticsearch, from_d: str, until_d: str, cs_only: bool = False, verbose: bool = True, by_datestamp: bool = False, skip_existing_ids: bool = False) -> int:
+    """Stream harvest -> filters -> bulk actions straight into parallel_bulk; one doc in flight per stage.
+
+    parallel_bulk cuts the stream into requests of up to ES_BULK_BYTES regardless of OAI
+    page boundaries, and indexes them while the main thread keeps harvesting.
+    """
+    total = 0
+    docs = _select(harvest(from_d, until_d, verbose), from_d, until_d, cs_only, by_datestamp)
+    if skip_existing_ids:
+        docs = skip_existing(es, docs)
+    for ok, info in parallel_bulk(
+        es.options(request_timeout=60), _bulk_actions(docs),
+        thread_count=BULK_THREADS, chunk_size=BULK_CHUNK_DOCS, max_chunk_bytes=BULK_CHUNK_BYTES,
+        queue_size=4, raise_on_error=False,
+    ):
+        total += 1
+        if not ok:
+            print(f"  bulk error: {info}", file=sys.stderr)
+    return total
+
+
+class _Throttle:
+    """Single-token bucket: at most one acquire() per `interval` seconds (arXiv asks for >= 1s between requests)."""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        if now < self._next:
+            await asyncio.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval
+
+
+async def ingest_range_async(es: AsyncElasticsearch, from_d: str, until_d: str, cs_only: bool = False, verbose: bool = True, by_datestamp: bool = False, skip_existing_ids: bool = False) -> int:
+    """Like ingest_range, but fetches the next OAI page while the previous one is being bulk indexed."""
+    pages: asyncio.Queue = asyncio.Queue(maxsize=2)
+
+    async def fetch_pages():
+        throttle = _Throttle(1.0)
+        cursor = {"token": None}
+        try:
+            async with httpx.AsyncClient(headers={"User-Agent": "elastic-papers/1.0", "Accept-Encoding": "gzip, deflate"}, timeout=120) as client:
+                while True:
+                    await throttle.acquire()
+                    r = await client.get(_oai_url(from_d, until_d, cursor["token"]))
+                    if not r.is_success:
+                        raise RuntimeError(f"OAI failed: {r.status_code}")
+                    # Parse off the event loop so indexing keeps going meanwhile
+                    records = await asyncio.to_thread(lambda: list(_parse_page(io.BytesIO(r.content), cursor)))
+                    await pages.put(records)
+                    if not cursor["token"]:
+                        break
+        except Exception as e:
+            await pages.put(e)  # surface fetch/parse errors in the consumer
+            return
+        await pages.put(None)
+
+    producer = asyncio.create_task(fetch_pages())
+    total = 0
+    page = 0
+    try:
+        while (records := await pages.get()) is not None:
+            if isinstance(records, Exception):
+                raise records
+            page += 1
+            docs = list(_select(records, from_d, until_d, cs_only, by_datestamp))
+            if skip_existing_ids and docs:
+                existing = await _existing_ids(es, [d["arxiv_id"] for d in docs])
+                docs = [d for d in docs if d["arxiv_id"] not in existing]
+            actions = _bulk_actions(docs)
+            n, errors = await async_bulk(es.options(request_timeout=60), actions, chunk_size=500, raise_on_error=False)
+            for info in errors:
+                print(f"  bulk error: {info}", file=sys.stderr)
+            n += len(errors)
+            total += n
+            if verbose:
+                print(f"  p{page}: +{n} (total {total})", flush=True)
+    except BaseException:
+        producer.cancel()
+        raise
     return total
 
 
 def ensure_index(es: Elasticsearch):
-    if es.indices.exists(index=INDEX_NAME):
-        return
     if INDEX_NAME.endswith("-semantic"):
-        raise SystemExit(f"Create semantic index first: python scripts/create_index.py semantic")
+        if not es.indices.exists(index=INDEX_NAME):
+            raise SystemExit(f"Create semantic index first: python scripts/create_index.py semantic")
+        return
     mapping = {
         "arxiv_id": {"type": "keyword"},
         "title": {"type": "text"},
@@ -198,10 +401,38 @@ def ensure_index(es: Elasticsearch):
         "categories": {"type": "keyword"},
         "created": {"type": "date", "format": "yyyy-MM-dd||yyyy-MM-dd'T'HH:mm:ss'Z'||strict_date_optional_time"},
     }
-    es.indices.create(index=INDEX_NAME, mappings={"properties": mapping})
+    # One round-trip: create and treat "already exists" as success (no exists() probe)
+    try:
+        es.indices.create(index=INDEX_NAME, mappings={"properties": mapping})
+    except BadRequestError as e:
+        if e.error != "resource_already_exists_exception":
+            raise
+        return
     print(f"Created index '{INDEX_NAME}'")
 
 
+@contextmanager
+def tuned_for_bulk(es: Elasticsearch):
+    """Turn off refresh and replicas for a large load, then restore them and force-merge.
+
+    Periodic refreshes during a backfill produce many tiny segments; skipping them (and
+    replica writes) speeds up bulk indexing considerably.
+    """
+    prev = es.indices.get_settings(index=INDEX_NAME)[INDEX_NAME]["settings"]["index"]
+    es.indices.put_settings(index=INDEX_NAME, settings={"index": {"refresh_interval": "-1", "number_of_replicas": 0}})
+    try:
+        yield
+    finally:
+        # Unset values go back as None, which resets them to the cluster default
+        es.indices.put_settings(index=INDEX_NAME, settings={"index": {
+            "refresh_interval": prev.get("refresh_interval"),
+            "number_of_replicas": prev.get("number_of_replicas"),
+        }})
+        print(f"Restored refresh/replica settings on '{INDEX_NAME}'", flush=True)
+    print(f"Force-merging '{INDEX_NAME}'...", flush=True)
+    es.options(request_timeout=3600).indices.forcemerge(index=INDEX_NAME, max_num_segments=5)
+
+
 def month_range(start_ym: str, end_ym: str):
     def parse(ym):
         y, m = map(int, ym.split("-"))
@@ -228,6 +459,18 @@ def month_range(start_ym: str, end_ym: str):
             m, y = 1, y + 1
 
 
+async def _ingest_ranges_async(ranges: list[tuple[str, str, str]], cs_only: bool, verbose: bool, by_datestamp: bool, skip_existing_ids: bool) -> int:
+    es = get_client(AsyncElasticsearch)
+    try:
+        total = 0
+        for label, from_d, until_d in ranges:
+            print(f">> {label}", flush=True)
+            total += await ingest_range_async(es, from_d, until_d, cs_only=cs_only, verbose=verbose, by_datestamp=by_datestamp, skip_existing_ids=skip_existing_ids)
+        return total
+    finally:
+        await es.close()
+
+
 def main():
     p = argparse.ArgumentParser(description="Ingest arXiv into Elasticsearch")
     p.add_argument("--from", dest="from_", metavar="YYYY-MM-DD", help="Start date (single range)")
@@ -236,31 +479,38 @@ def main():
     p.add_argument("--end", metavar="YYYY-MM", help="End month (backfill mode)")
     p.add_argument("--quiet", "-q", action="store_true", help="Less output")
     p.add_argument("--cs-only", action="store_true", help="Ingest only computer science papers (categories starting with cs.)")
+    p.add_argument("--by-datestamp", action="store_true", help="Trust OAI from/until (metadata datestamp) and skip the created-date filter")
+    p.add_argument("--skip-existing", action="store_true", help="Look up ids first (mget) and only send papers not already indexed; for re-runs")
+    p.add_argument("--tune-for-bulk", action="store_true", help="Disable refresh/replicas while ingesting, restore and force-merge after")
+    p.add_argument("--async", dest="use_async", action="store_true", help="Overlap OAI fetching with bulk indexing (asyncio)")
     args = p.parse_args()
 
-    es = _get_es_client()
+    es = get_client()
     ensure_index(es)
 
     today = date.today().isoformat()
 
     if args.start and args.end:
         # Monthly backfill
-        total = 0
-        for label, from_d, until_d in month_range(args.start, args.end):
-            print(f">> {label} ({from_d}..{until_d})", flush=True)
-            n = ingest_range(es, from_d, until_d, cs_only=args.cs_only, verbose=not args.quiet)
-            total += n
-        print(f"Done. Indexed {total} papers into '{INDEX_NAME}'")
+        ranges = [(f"{label} ({from_d}..{until_d})", from_d, until_d) for label, from_d, until_d in month_range(args.start, args.end)]
     elif args.from_ and args.until:
         # Single range
         until_d = min(args.until, today)
-        print(f">> {args.from_}..{until_d}", flush=True)
-        n = ingest_range(es, args.from_, until_d, cs_only=args.cs_only, verbose=not args.quiet)
-        print(f"Done. Indexed {n} papers into '{INDEX_NAME}'")
+        ranges = [(f"{args.from_}..{until_d}", args.from_, until_d)]
     else:
         p.print_help()
         sys.exit(1)
 
+    with tuned_for_bulk(es) if args.tune_for_bulk else nullcontext():
+        if args.use_async:
+            total = asyncio.run(_ingest_ranges_async(ranges, cs_only=args.cs_only, verbose=not args.quiet, by_datestamp=args.by_datestamp, skip_existing_ids=args.skip_existing))
+        else:
+            total = 0
+            for label, from_d, until_d in ranges:
+                print(f">> {label}", flush=True)
+                total += ingest_range(es, from_d, until_d, cs_only=args.cs_only, verbose=not args.quiet, by_datestamp=args.by_datestamp, skip_existing_ids=args.skip_existing)
+    print(f"Done. Indexed {total} papers into '{INDEX_NAME}'")
+
 
 if __name__ == "__main__":
     main()
@@ -2,14 +2,51 @@
 
 import os
 import sys
+from functools import lru_cache
 
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 
+try:
+    from elasticsearch.serializer import OrjsonSerializer
+except ImportError:  # orjson not installed (or elasticsearch < 8.13): stdlib json
+    OrjsonSerializer = None
+
 load_dotenv()
 
+# Transport tuning shared by every client: gzip request bodies (bulk payloads of titles and
+# abstracts compress well), enough pooled connections for parallel_bulk threads, and
+# retries on timeouts rather than failing a whole ingest run.
+CLIENT_OPTIONS = {
+    "http_compress": True,
+    "connections_per_node": 16,
+    "request_timeout": 60,
+    "retry_on_timeout": True,
+    "max_retries": 3,
+}
+if OrjsonSerializer is not None:
+    # orjson encodes bulk actions several times faster than stdlib json
+    CLIENT_OPTIONS["serializer"] = OrjsonSerializer()
+
+
+def get_client(client_cls=Elasticsearch) -> Elasticsearch:
+    """Client from env vars. Pass AsyncElasticsearch as client_cls for the asyncio variant.
+
+    The sync client is built once per process so repeat callers reuse its pooled
+    keep-alive connections. Async clients are tied to an event loop and closed by
+    their caller, so each call gets a fresh one.
+    """
+    if client_cls is Elasticsearch:
+        return _shared_client()
+    return _build_client(client_cls)
+
+
+@lru_cache(maxsize=1)
+def _shared_client() -> Elasticsearch:
+    return _build_client(Elasticsearch)
+
 
-def get_client() -> Elasticsearch:
+def _build_client(client_cls):
     cloud_id = os.getenv("ELASTICSEARCH_CLOUD_ID")
     url = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
     user = os.getenv("ELASTICSEARCH_USER")
@@ -17,12 +54,12 @@ def get_client() -> Elasticsearch:
     api_key = os.getenv("ELASTICSEARCH_API_KEY")
 
     if cloud_id and api_key:
-        return Elasticsearch(cloud_id=cloud_id, api_key=api_key)
+        return client_cls(cloud_id=cloud_id, api_key=api_key, **CLIENT_OPTIONS)
     if cloud_id and user and password:
-        return Elasticsearch(cloud_id=cloud_id, basic_auth=(user, password))
+        return client_cls(cloud_id=cloud_id, basic_auth=(user, password), **CLIENT_OPTIONS)
     if url and user and password:
-        return Elasticsearch(hosts=[url], basic_auth=(user, password))
+        return client_cls(hosts=[url], basic_auth=(user, password), **CLIENT_OPTIONS)
     if url:
-        return Elasticsearch(hosts=[url])
+        return client_cls(hosts=[url], **CLIENT_OPTIONS)
     print("Error: Set ELASTICSEARCH_CLOUD_ID + ELASTICSEARCH_API_KEY in .env", file=sys.stderr)
     sys.exit(1)
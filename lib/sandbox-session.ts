@@ -21,6 +21,7 @@ export type SandboxSession = {
   createdAt: number;
   messages: SandboxMessage[]; // Claude conversation history
   steps: CommandStep[];       // All commands executed
+  repoSnapshot?: string;      // ls + key files captured at creation, sent with the first message
 };
 
 // Attach to globalThis so the store survives Next.js hot-reloads in dev mode.
@@ -33,13 +34,18 @@ if (!globalSessions.__sandboxSessions) {
 }
 const sessions = globalSessions.__sandboxSessions;
 
-export function createSession(sandboxId: string, repoUrl: string): SandboxSession {
+export function createSession(
+  sandboxId: string,
+  repoUrl: string,
+  repoSnapshot?: string
+): SandboxSession {
   const session: SandboxSession = {
     sandboxId,
     repoUrl,
     createdAt: Date.now(),
     messages: [],
     steps: [],
+    repoSnapshot,
   };
   sessions.set(sandboxId, session);
   return session;
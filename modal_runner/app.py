@@ -10,17 +10,67 @@ Then warm the pool:  curl -X POST https://YOUR--paper-demo-runner-warm-pool.moda
 """
 
 import modal
+import asyncio
+import atexit
 import json
+import logging
 import os
+import queue
+import sys
 import time
+from logging.handlers import QueueHandler, QueueListener
 
 app = modal.App("paper-demo-runner")
 
+
+# ─── Logging ─────────────────────────────────────────────────────────────────
+# JSON lines, one per event. Records go through an in-memory queue and are
+# written by a background listener thread, so request handlers never block
+# on stdout; fields passed via extra= become JSON keys.
+
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        return json.dumps(entry, default=str)
+
+
+def _setup_logging() -> logging.Logger:
+    logger = logging.getLogger("paper-demo-runner")
+    if logger.handlers:
+        return logger
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(_JsonFormatter())
+    records = queue.Queue(-1)
+    listener = QueueListener(records, stream)
+    listener.start()
+    atexit.register(listener.stop)  # flush queued records on container shutdown
+    logger.addHandler(QueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+log = _setup_logging()
+
+
 # Light image for the web endpoint functions (needs FastAPI)
 function_image = modal.Image.debian_slim(python_version="3.11").pip_install("fastapi[standard]")
 
+PIP_CACHE_DIR = "/root/.cache/pip"
+
 # Lightweight sandbox image — just git + basic dev tools.
 # The Claude agent installs project-specific packages as needed via pip/npm/etc.
+# Keep ML stacks (torch, transformers, ...) out of here: most repos don't need them,
+# they'd slow every cold start, and the shared pip cache below makes the per-repo
+# install cheap after the first time.
 sandbox_image = (
     modal.Image.debian_slim(python_version="3.11")
     .apt_install(
@@ -30,88 +80,128 @@ sandbox_image = (
     )
     .pip_install("pip", "setuptools", "wheel")
     .run_commands("curl -fsSL https://deb.nodesource.com/setup_20.x | bash - && apt-get install -y nodejs")
+    .env({"PIP_CACHE_DIR": PIP_CACHE_DIR, "PIP_NO_INPUT": "1"})
 )
 
+# Shared pip cache: wheels downloaded/built in one sandbox (numpy, torch, ...) are
+# reused by every later one instead of being fetched and compiled again.
+pip_cache = modal.Volume.from_name("pip-wheel-cache", create_if_missing=True)
+SANDBOX_VOLUMES = {PIP_CACHE_DIR: pip_cache}
+PIP_SYNC_TIMEOUT = 60  # seconds; terminate_sandbox's function timeout must stay above this
+
 SANDBOX_TIMEOUT = 3600   # 1 hour max lifetime
 POOL_TARGET = 3          # keep this many warm sandboxes ready
+POOL_MAX_AGE = SANDBOX_TIMEOUT - 600  # don't hand out sandboxes with <10 min left
+
+# Files the agent would otherwise read one command at a time on its first turn.
+# Their contents are returned with the new sandbox so the agent can skip those rounds.
+SNAPSHOT_FILES = [
+    "README.md", "README.rst", "README.txt", "README",
+    "requirements.txt", "pyproject.toml", "setup.py", "environment.yml", "package.json",
+]
+SNAPSHOT_MAX_BYTES = 6000  # per file
+CLONE_TIMEOUT = 240        # seconds; create_sandbox's function timeout (300) must stay above this
+
+# Each exec is a fresh bash process started in REPO_DIR, so cwd and exported env
+# (e.g. an activated venv) are saved here on exit and restored before the next command.
+# The file is replaced atomically: commands from one agent turn can run concurrently,
+# and the last to finish wins with a complete state rather than an interleaved one.
+REPO_DIR = "/root/repo"
+SHELL_STATE = "/root/.agent_shell_state"
+SHELL_PRELUDE = (
+    f"[ -f {SHELL_STATE} ] && . {SHELL_STATE} 2>/dev/null\n"
+    f"trap '__rc=$?; {{ echo \"cd $(printf %q \"$PWD\")\"; export -p; }} > {SHELL_STATE}.$$ "
+    f"&& mv -f {SHELL_STATE}.$$ {SHELL_STATE}; exit $__rc' EXIT\n"
+)
 
-# Distributed dict to persist pool state across function invocations
-pool_dict = modal.Dict.from_name("sandbox-pool", create_if_missing=True)
+# Distributed queue of warm sandboxes: {"id": ..., "created": ...}. A get() is an
+# atomic dequeue, so concurrent claims can't hand out the same sandbox.
+pool_queue = modal.Queue.from_name("sandbox-pool-queue", create_if_missing=True)
 
 
-# ─── Pool helpers ─────────────────────────────────────────────────────────────
+# ─── Process helpers ─────────────────────────────────────────────────────────
+
+async def _read_streams(p, timeout: int = 130) -> tuple[str, str, int]:
+    """Drain stdout and stderr of a sandbox process concurrently, then wait for it.
 
-def _get_pool_ids() -> list:
-    """Read the list of pre-warmed sandbox IDs from the distributed dict."""
+    Reading one stream to EOF before the other can stall if the process fills
+    the other pipe first; reading both at once avoids that.
+    """
+    stdout, stderr = await asyncio.wait_for(
+        asyncio.gather(p.stdout.read.aio(), p.stderr.read.aio()), timeout
+    )
+    return stdout, stderr, await p.wait.aio()
+
+
+async def _terminate_quietly(sb):
     try:
-        raw = pool_dict.get("ids")
-        return json.loads(raw) if raw else []
+        await sb.terminate.aio()
     except Exception:
-        return []
+        pass
 
 
-def _set_pool_ids(ids: list):
-    """Write the list of sandbox IDs to the distributed dict."""
-    pool_dict["ids"] = json.dumps(ids)
+# ─── Pool helpers ─────────────────────────────────────────────────────────────
+
+def _is_fresh(entry: dict) -> bool:
+    return time.time() - entry["created"] < POOL_MAX_AGE
 
 
-def _claim_sandbox():
+async def _claim_sandbox():
     """Try to grab a pre-warmed sandbox from the pool. Returns (Sandbox, id) or None."""
-    ids = _get_pool_ids()
-    while ids:
-        sid = ids.pop(0)
-        _set_pool_ids(ids)  # save immediately so another request doesn't grab the same one
+    while True:
+        try:
+            entry = await pool_queue.get.aio(block=False)
+        except queue.Empty:
+            return None
+        sid = entry["id"]
+        if not _is_fresh(entry):
+            log.warning("pool sandbox too old, skipping", extra={"sandbox_id": sid})
+            continue
         try:
-            sb = modal.Sandbox.from_id(sid)
-            print(f"✅ Claimed pre-warmed sandbox {sid} (pool now {len(ids)})")
+            sb = await modal.Sandbox.from_id.aio(sid)
+            log.info("claimed pre-warmed sandbox", extra={"sandbox_id": sid})
             return sb, sid
         except Exception:
-            print(f"⚠️  Pool sandbox {sid} expired, skipping")
-            continue
-    return None
+            log.warning("pool sandbox expired, skipping", extra={"sandbox_id": sid})
 
 
 # ─── Replenish pool (background function) ────────────────────────────────────
 
 @app.function(timeout=600, image=function_image)
 def replenish_pool():
-    """Create sandboxes to fill the pool back up to POOL_TARGET."""
-    ids = _get_pool_ids()
-
-    # Prune dead sandboxes
-    alive = []
-    for sid in ids:
-        try:
-            modal.Sandbox.from_id(sid)
-            alive.append(sid)
-        except Exception:
-            print(f"  Pruned expired sandbox {sid}")
+    """Create sandboxes to fill the pool back up to POOL_TARGET.
 
-    needed = max(0, POOL_TARGET - len(alive))
-    print(f"Pool status: {len(alive)} alive, need {needed} more")
+    Entries are never drained here: emptying the queue even briefly would send
+    concurrent claims to cold creation. Stale entries count toward the target until
+    a claim pops and discards them (see _is_fresh), and that claim spawns this again.
+    """
+    pooled = pool_queue.len()
+    needed = max(0, POOL_TARGET - pooled)
+    log.info("pool status", extra={"pooled": pooled, "needed": needed})
 
     for i in range(needed):
         try:
-            sb = modal.Sandbox.create(image=sandbox_image, app=app, timeout=SANDBOX_TIMEOUT)
-            alive.append(sb.object_id)
-            print(f"  Created pool sandbox {i+1}/{needed}: {sb.object_id}")
+            sb = modal.Sandbox.create(
+                image=sandbox_image, app=app, timeout=SANDBOX_TIMEOUT, volumes=SANDBOX_VOLUMES
+            )
+            pool_queue.put({"id": sb.object_id, "created": time.time()})
+            log.info("created pool sandbox", extra={"sandbox_id": sb.object_id, "n": i + 1, "needed": needed})
         except Exception as e:
-            print(f"  Failed to create pool sandbox: {e}")
+            log.error("failed to create pool sandbox", extra={"error": str(e)})
 
-    _set_pool_ids(alive)
-    return {"pool_size": len(alive), "created": needed}
+    return {"pool_size": pool_queue.len(), "created": needed}
 
 
 # ─── Warm pool endpoint (call after deploy or on-demand) ─────────────────────
 
 @app.function(timeout=600, image=function_image)
 @modal.fastapi_endpoint(method="POST")
-def warm_pool(request: dict = {}):
+async def warm_pool(request: dict = {}):
     """
     POST /warm_pool — fill the sandbox pool to POOL_TARGET.
     Call this after deploying or anytime you want warm sandboxes ready.
     """
-    result = replenish_pool.remote()
+    result = await replenish_pool.remote.aio()
     return result
 
 
@@ -119,30 +209,23 @@ def warm_pool(request: dict = {}):
 
 @app.function(timeout=30, image=function_image)
 @modal.fastapi_endpoint(method="GET")
-def pool_status():
+async def pool_status():
     """GET /pool_status — check how many sandboxes are in the pool."""
-    ids = _get_pool_ids()
-    alive = 0
-    for sid in ids:
-        try:
-            modal.Sandbox.from_id(sid)
-            alive += 1
-        except Exception:
-            pass
-    return {"pool_size": alive, "target": POOL_TARGET, "raw_ids": len(ids)}
+    return {"pool_size": await pool_queue.len.aio(), "target": POOL_TARGET}
 
 
 # ─── Create sandbox ──────────────────────────────────────────────────────────
 
 @app.function(timeout=300, image=function_image)
 @modal.fastapi_endpoint(method="POST")
-def create_sandbox(request: dict):
+async def create_sandbox(request: dict):
     """
     POST: { "repo_url": "https://github.com/...", "env_vars": { "KEY": "val" } }
 
     Grabs a pre-warmed sandbox from the pool (fast) or creates one on-demand (slower).
     Then clones the repo and writes env vars into it.
     """
+    sb = None
     try:
         repo_url = request.get("repo_url", "").strip()
         env_vars = request.get("env_vars", {})
@@ -153,95 +236,101 @@ def create_sandbox(request: dict):
             return {"error": "Only public GitHub HTTPS URLs are supported."}
 
         # 1) Try to claim a pre-warmed sandbox from the pool
-        claimed = _claim_sandbox()
+        claimed = await _claim_sandbox()
         if claimed:
             sb, sandbox_id = claimed
             from_pool = True
         else:
             # Fallback: create on-demand
-            print(f"Pool empty — creating sandbox on-demand for {repo_url}...")
-            sb = modal.Sandbox.create(
+            log.info("pool empty, creating sandbox on-demand", extra={"repo_url": repo_url})
+            sb = await modal.Sandbox.create.aio(
                 image=sandbox_image,
                 app=app,
                 timeout=SANDBOX_TIMEOUT,
+                volumes=SANDBOX_VOLUMES,
             )
             sandbox_id = sb.object_id
             from_pool = False
-            print(f"Created on-demand sandbox {sandbox_id}")
+            log.info("created on-demand sandbox", extra={"sandbox_id": sandbox_id})
 
-        # 2) Trigger async pool replenishment (fire-and-forget)
-        try:
-            replenish_pool.spawn()
-        except Exception:
-            pass  # non-critical
+        # 2) Trigger async pool replenishment (fire-and-forget); the spawn RPC runs
+        #    alongside the clone instead of ahead of it
+        async def spawn_replenish():
+            try:
+                await replenish_pool.spawn.aio()
+            except Exception:
+                pass  # non-critical
+
+        replenish = asyncio.create_task(spawn_replenish())
 
         # 3) Clone repo
-        p = sb.exec("bash", "-c", f"git clone --depth 1 {repo_url} /root/repo 2>&1")
-        clone_output = p.stdout.read()
+        # Shallow, single-branch, no tags; blobs are fetched only for what's checked out
         try:
-            p.wait()
-        except Exception:
-            pass
-        clone_exit = p.returncode
+            p = await sb.exec.aio("bash", "-c",
+                "git -c protocol.version=2 clone --depth=1 --single-branch --no-tags --filter=blob:none "
+                f"{repo_url} {REPO_DIR} 2>&1",
+                timeout=CLONE_TIMEOUT,
+            )
+            clone_output, _, clone_exit = await _read_streams(p, timeout=CLONE_TIMEOUT + 10)
+        finally:
+            # The pool lost a sandbox either way; spawn_replenish never raises
+            await replenish
 
         if clone_exit != 0:
-            try:
-                sb.terminate()
-            except Exception:
-                pass
+            await _terminate_quietly(sb)
             return {
                 "error": f"Failed to clone: {clone_output}",
                 "sandbox_id": None,
             }
 
-        # 4) Write env vars if provided
+        # 4) Write env vars (next to any .env sample too) and gather the repo structure +
+        #    key files for context, all in one round-trip
+        script = ""
         if env_vars and isinstance(env_vars, dict) and len(env_vars) > 0:
             env_content = "\n".join(f'{k}="{v}"' for k, v in env_vars.items()) + "\n"
-            p = sb.exec("bash", "-c", f"cat > /root/repo/.env << 'ENVEOF'\n{env_content}ENVEOF")
-            try:
-                p.wait()
-            except Exception:
-                pass
-            p = sb.exec("bash", "-c",
-                f"find /root/repo -name '.env.sample' -o -name '.env.example' -o -name '.env.template' | "
-                f"while read f; do dir=$(dirname \"$f\"); if [ ! -f \"$dir/.env\" ]; then "
-                f"cat > \"$dir/.env\" << 'ENVEOF'\n{env_content}ENVEOF\nfi; done"
+            script += (
+                f"cat > /root/repo/.env << 'ENVEOF'\n{env_content}ENVEOF\n"
+                "find /root/repo \\( -name .env.sample -o -name .env.example -o -name .env.template \\) "
+                "-printf '%h\\n' | sort -u | while read d; do [ -f \"$d/.env\" ] || cp /root/repo/.env \"$d/.env\"; done\n"
             )
-            try:
-                p.wait()
-            except Exception:
-                pass
-
-        # 5) Get repo structure for context
-        p = sb.exec("bash", "-c", "ls -la /root/repo 2>&1 | head -30")
-        ls_output = p.stdout.read()
-        try:
-            p.wait()
-        except Exception:
-            pass
+        script += (
+            "ls -la /root/repo 2>&1 | head -30; echo __SNAPSHOT__; cd /root/repo && "
+            f"for f in {' '.join(SNAPSHOT_FILES)}; do "
+            f"[ -f \"$f\" ] && {{ echo \"===== $f =====\"; head -c {SNAPSHOT_MAX_BYTES} \"$f\"; echo; }}; done; true"
+        )
+        p = await sb.exec.aio("bash", "-c", script)
+        out, _, _ = await _read_streams(p)
+        ls_output, _, repo_snapshot = out.partition("__SNAPSHOT__\n")
 
         source = "pool" if from_pool else "on-demand"
-        print(f"Sandbox {sandbox_id} ready ({source}) with repo cloned")
+        log.info("sandbox ready", extra={"sandbox_id": sandbox_id, "source": source, "repo_url": repo_url})
 
         return {
             "sandbox_id": sandbox_id,
             "repo_url": repo_url,
             "clone_output": clone_output.strip(),
             "ls_output": ls_output.strip(),
+            "repo_snapshot": repo_snapshot.strip(),
             "from_pool": from_pool,
         }
     except Exception as e:
-        print(f"create_sandbox error: {e}")
+        log.exception("create_sandbox failed")
+        # Already claimed from the pool (or created for this request): nobody else will
+        # ever use it, so don't leave it running until SANDBOX_TIMEOUT
+        if sb is not None:
+            await _terminate_quietly(sb)
         return {"error": f"Sandbox creation failed: {str(e)}"}
 
 
 # ─── Execute command in sandbox ──────────────────────────────────────────────
 
 @app.function(timeout=180, image=function_image)
+@modal.concurrent(max_inputs=32)  # requests mostly await sandbox RPCs; share one container
 @modal.fastapi_endpoint(method="POST")
-def exec_command(request: dict):
+async def exec_command(request: dict):
     """
-    Execute a command in an existing sandbox.
+    Execute a command in an existing sandbox. Working directory and exported
+    env carry over between calls, like a terminal session.
 
     POST: { "sandbox_id": "sb-...", "command": "ls -la" }
     Returns: { "stdout": "...", "stderr": "...", "exit_code": 0 }
@@ -253,22 +342,25 @@ def exec_command(request: dict):
         return {"error": "sandbox_id and command are required"}
 
     try:
-        sb = modal.Sandbox.from_id(sandbox_id)
+        sb = await modal.Sandbox.from_id.aio(sandbox_id)
     except Exception as e:
         return {"error": f"Sandbox not found or terminated: {e}"}
 
-    # Always run from the repo directory
-    full_cmd = f"cd /root/repo && {command}"
+    # Starts in REPO_DIR; the prelude moves to wherever the previous command left off
+    full_cmd = SHELL_PRELUDE + command
 
     try:
-        p = sb.exec("bash", "-c", full_cmd, timeout=120)
-        stdout = p.stdout.read()
-        stderr = p.stderr.read()
-        try:
-            p.wait()
-        except Exception:
-            pass
-        exit_code = p.returncode
+        started = time.monotonic()
+        p = await sb.exec.aio("bash", "-c", full_cmd, timeout=120, workdir=REPO_DIR)
+        stdout, stderr, exit_code = await _read_streams(p)
+        log.info("exec", extra={
+            "sandbox_id": sandbox_id,
+            "cmd": command[:200],
+            "exit_code": exit_code,
+            "elapsed_s": round(time.monotonic() - started, 3),
+            "stdout_bytes": len(stdout),
+            "stderr_bytes": len(stderr),
+        })
 
         # Truncate very long outputs
         if len(stdout) > 10000:
@@ -282,6 +374,7 @@ def exec_command(request: dict):
             "exit_code": exit_code,
         }
     except Exception as e:
+        log.warning("exec failed", extra={"sandbox_id": sandbox_id, "cmd": command[:200], "error": str(e)})
         return {
             "stdout": "",
             "stderr": str(e),
@@ -291,9 +384,9 @@ def exec_command(request: dict):
 
 # ─── Terminate sandbox ──────────────────────────────────────────────────────
 
-@app.function(timeout=30, image=function_image)
+@app.function(timeout=120, image=function_image)  # room for the pip cache sync below
 @modal.fastapi_endpoint(method="POST")
-def terminate_sandbox(request: dict):
+async def terminate_sandbox(request: dict):
     """
     Terminate a sandbox.
 
@@ -305,9 +398,25 @@ def terminate_sandbox(request: dict):
         return {"error": "sandbox_id is required"}
 
     try:
-        sb = modal.Sandbox.from_id(sandbox_id)
-        sb.terminate()
-        print(f"Terminated sandbox {sandbox_id}")
-        return {"terminated": True}
+        sb = await modal.Sandbox.from_id.aio(sandbox_id)
     except Exception as e:
         return {"error": f"Failed to terminate: {e}"}
+
+    terminate_error = None
+    try:
+        # Flush new wheels to the shared pip cache volume before the sandbox goes away
+        p = await sb.exec.aio("sync", PIP_CACHE_DIR, timeout=PIP_SYNC_TIMEOUT)
+        await _read_streams(p, timeout=PIP_SYNC_TIMEOUT)
+    except Exception as e:
+        log.warning("pip cache sync failed", extra={"sandbox_id": sandbox_id, "error": str(e)})
+    finally:
+        # Always runs, so a slow or failed sync can't leave the sandbox up until SANDBOX_TIMEOUT
+        try:
+            await sb.terminate.aio()
+        except Exception as e:
+            terminate_error = e
+
+    if terminate_error is not None:
+        return {"error": f"Failed to terminate: {terminate_error}"}
+    log.info("terminated sandbox", extra={"sandbox_id": sandbox_id})
+    return {"terminated": True}
@@ -22,7 +22,7 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from elasticsearch import Elasticsearch
+from elasticsearch import BadRequestError, Elasticsearch, NotFoundError
 
 from lib.es_client import get_client
 
@@ -60,38 +60,47 @@ SEMANTIC_MAPPING = {
 }
 
 
+def _create(es: Elasticsearch, name: str, mappings: dict) -> bool:
+    """Create the index in one request; False if it already exists."""
+    try:
+        es.indices.create(index=name, mappings=mappings)
+        return True
+    except BadRequestError as e:
+        if e.error != "resource_already_exists_exception":
+            raise
+        print(f"Index '{name}' already exists")
+        return False
+
+
 def create_basic(es: Elasticsearch) -> None:
-    if es.indices.exists(index=BASIC_INDEX):
-        print(f"Index '{BASIC_INDEX}' already exists")
-        return
-    es.indices.create(index=BASIC_INDEX, mappings=BASIC_MAPPING)
-    print(f"Created index '{BASIC_INDEX}'")
+    if _create(es, BASIC_INDEX, BASIC_MAPPING):
+        print(f"Created index '{BASIC_INDEX}'")
 
 
 def create_semantic(es: Elasticsearch) -> None:
-    if es.indices.exists(index=SEMANTIC_INDEX):
-        print(f"Index '{SEMANTIC_INDEX}' already exists")
-        return
-    es.indices.create(index=SEMANTIC_INDEX, mappings=SEMANTIC_MAPPING)
-    print(f"Created index '{SEMANTIC_INDEX}' (abstract uses semantic_text, auto-embedded on ingest)")
+    if _create(es, SEMANTIC_INDEX, SEMANTIC_MAPPING):
+        print(f"Created index '{SEMANTIC_INDEX}' (abstract uses semantic_text, auto-embedded on ingest)")
 
 
 def list_indices(es: Elasticsearch) -> None:
-    indices = es.cat.indices(format="json")
+    # bytes="b": store.size comes back as a plain byte count rather than "1.2gb"
+    indices = es.cat.indices(format="json", h="index,docs.count,store.size", bytes="b")
     for idx in sorted(indices, key=lambda x: x.get("index", "")):
         name = idx.get("index", "")
         if name.startswith("."):
             continue
         docs = idx.get("docs.count", "?")
-        store = idx.get("store.size", "?")
-        print(f"  {name:<40} docs={docs:<10} size={store}")
+        store = idx.get("store.size") or ""
+        size = f"{int(store) / 1e6:.1f}MB" if store.isdigit() else "?"
+        print(f"  {name:<40} docs={docs:<10} size={size}")
 
 
 def delete_index(es: Elasticsearch, name: str) -> None:
-    if not es.indices.exists(index=name):
+    try:
+        es.indices.delete(index=name)
+    except NotFoundError:
         print(f"Index '{name}' does not exist")
         return
-    es.indices.delete(index=name)
     print(f"Deleted index '{name}'")
 
 
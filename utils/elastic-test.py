@@ -8,12 +8,24 @@ Load credentials from .env (copy .env.example to .env and fill in your values).
 """
 
 import os
+from functools import lru_cache
+
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
 
 load_dotenv()
 
+# Keep-alive pool, gzip bodies, and retries on flaky Cloud connections
+CLIENT_OPTIONS = {
+    "http_compress": True,
+    "request_timeout": 30,
+    "max_retries": 3,
+    "retry_on_timeout": True,
+    "connections_per_node": 10,
+}
+
 
+@lru_cache(maxsize=1)
 def get_es_client():
     """Connect using env vars. Supports Elastic Cloud (API key) or local URL."""
     cloud_id = os.getenv("ELASTICSEARCH_CLOUD_ID")
@@ -23,13 +35,13 @@ def get_es_client():
     password = os.getenv("ELASTICSEARCH_PASSWORD")
 
     if cloud_id and api_key:
-        return Elasticsearch(cloud_id=cloud_id, api_key=api_key)
+        return Elasticsearch(cloud_id=cloud_id, api_key=api_key, **CLIENT_OPTIONS)
     if cloud_id and user and password:
-        return Elasticsearch(cloud_id=cloud_id, basic_auth=(user, password))
+        return Elasticsearch(cloud_id=cloud_id, basic_auth=(user, password), **CLIENT_OPTIONS)
     if url and user and password:
-        return Elasticsearch(hosts=[url], basic_auth=(user, password))
+        return Elasticsearch(hosts=[url], basic_auth=(user, password), **CLIENT_OPTIONS)
     if url:
-        return Elasticsearch(hosts=[url])
+        return Elasticsearch(hosts=[url], **CLIENT_OPTIONS)
     raise ValueError(
         "For Elastic Cloud: set ELASTICSEARCH_CLOUD_ID + ELASTICSEARCH_API_KEY "
         "(create API key in Security → API Keys in the dashboard)"